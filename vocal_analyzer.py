@@ -1,25 +1,59 @@
 import random
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+try:
+    from pydub import AudioSegment
+except ImportError:  # pragma: no cover - pydub is optional for the simulated metrics
+    AudioSegment = None
+
+# Krumhansl-Schmuckler key profiles, indexed from the tonic
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
 
 class VocalAnalyzer:
     """Simulates AI-powered vocal analysis with realistic metrics"""
     
     def __init__(self):
         self.keys = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        self.modes = ['Major', 'Minor', 'Dorian', 'Mixolydian']
+        self.modes = ['Major', 'Minor']
+        
+        # STFT settings shared by key, tempo and spectral analysis
+        self.sample_rate = 22050
+        self.n_fft = 4096
+        self.hop_length = 512
+        self.frame_batch = 1024
+        self.bpm_range = (60, 200)
+        
+        # Templates for every tonic: rows 0-11 major, rows 12-23 minor
+        templates = np.stack(
+            [np.roll(MAJOR_PROFILE, i) for i in range(12)]
+            + [np.roll(MINOR_PROFILE, i) for i in range(12)]
+        )
+        self.key_templates = self._zscore(templates)
         
     def analyze(self, file_path: str) -> Dict[str, Any]:
         """Perform comprehensive vocal analysis"""
         
-        # Simulate file size and duration analysis
-        file_size = os.path.getsize(file_path)
-        estimated_duration = max(30, min(300, file_size / (1024 * 50)))  # Rough estimate
+        samples = self._load_samples(file_path)
         
-        # Generate realistic vocal metrics
-        key = random.choice(self.keys)
-        mode = random.choice(self.modes)
-        bpm = random.randint(65, 180)
+        if samples is not None and len(samples) >= self.n_fft:
+            # Compute the STFT once and share it across all spectral metrics
+            magnitudes, freqs = self._stft(samples)
+            key, mode, key_confidence = self._estimate_key(magnitudes, freqs)
+            bpm, bpm_confidence = self._estimate_tempo(magnitudes)
+            spectral_centroid = self._spectral_centroid(magnitudes, freqs)
+            estimated_duration = len(samples) / self.sample_rate
+        else:
+            # Undecodable audio: fall back to neutral defaults with zero confidence
+            file_size = os.path.getsize(file_path)
+            estimated_duration = max(30, min(300, file_size / (1024 * 50)))  # Rough estimate
+            key, mode, key_confidence = 'C', 'Major', 0.0
+            bpm, bpm_confidence = 120, 0.0
+            spectral_centroid = round(random.uniform(800, 2500), 1)
         
         # Vocal range analysis
         range_types = ['Soprano', 'Alto', 'Tenor', 'Bass', 'Mezzo-Soprano', 'Baritone']
@@ -61,12 +95,14 @@ class VocalAnalyzer:
                 round(random.uniform(1800, 3200), 1)  # F3
             ],
             "harmonic_richness": round(random.uniform(0.4, 0.9), 2),
-            "spectral_centroid": round(random.uniform(800, 2500), 1)
+            "spectral_centroid": spectral_centroid
         }
         
         return {
             "key": f"{key} {mode}",
+            "key_confidence": key_confidence,
             "bpm": bpm,
+            "bpm_confidence": bpm_confidence,
             "duration_seconds": round(estimated_duration, 1),
             "range": {
                 "type": vocal_range,
@@ -79,3 +115,112 @@ class VocalAnalyzer:
             "frequency_analysis": frequency_analysis,
             "confidence_score": round(random.uniform(85, 97), 1)
         }
+    
+    def _load_samples(self, file_path: str) -> Optional[np.ndarray]:
+        """Decode audio to mono float samples at the analysis sample rate"""
+        
+        if AudioSegment is None:
+            return None
+        
+        try:
+            audio = AudioSegment.from_file(file_path)
+        except Exception:
+            return None
+        
+        audio = audio.set_channels(1).set_frame_rate(self.sample_rate).set_sample_width(2)
+        samples = np.frombuffer(audio.raw_data, dtype=np.int16).astype(np.float32)
+        return samples / 32768.0
+    
+    def _stft(self, samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Magnitude spectrogram (frames x bins) computed in batched FFTs"""
+        
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.n_fft)[::self.hop_length]
+        window = np.hanning(self.n_fft).astype(np.float32)
+        
+        magnitudes = np.empty((len(frames), self.n_fft // 2 + 1), dtype=np.float32)
+        for start in range(0, len(frames), self.frame_batch):
+            batch = frames[start:start + self.frame_batch] * window
+            magnitudes[start:start + self.frame_batch] = np.abs(np.fft.rfft(batch, axis=1))
+        
+        freqs = np.fft.rfftfreq(self.n_fft, d=1.0 / self.sample_rate)
+        return magnitudes, freqs
+    
+    def _estimate_key(self, magnitudes: np.ndarray, freqs: np.ndarray) -> Tuple[str, str, float]:
+        """Key and mode from a chroma profile correlated against key templates"""
+        
+        # Map FFT bins in the musical range onto the 12 pitch classes
+        in_range = (freqs >= 65.0) & (freqs <= 2000.0)
+        midi = 69 + 12 * np.log2(freqs[in_range] / 440.0)
+        pitch_class = np.round(midi).astype(int) % 12
+        bin_to_chroma = np.zeros((in_range.sum(), 12), dtype=np.float32)
+        bin_to_chroma[np.arange(len(pitch_class)), pitch_class] = 1.0
+        
+        chroma = (magnitudes[:, in_range] ** 2) @ bin_to_chroma
+        frame_energy = chroma.sum(axis=1, keepdims=True)
+        voiced = frame_energy[:, 0] > 0
+        if not voiced.any():
+            return 'C', 'Major', 0.0
+        profile = (chroma[voiced] / frame_energy[voiced]).sum(axis=0)
+        
+        correlations = self.key_templates @ self._zscore(profile) / 12
+        best = int(np.argmax(correlations))
+        key = self.keys[best % 12]
+        mode = self.modes[best // 12]
+        confidence = round(float(np.clip(correlations[best], 0, 1)) * 100, 1)
+        return key, mode, confidence
+    
+    def _estimate_tempo(self, magnitudes: np.ndarray) -> Tuple[int, float]:
+        """Tempo from the autocorrelation of the spectral-flux onset envelope"""
+        
+        frame_rate = self.sample_rate / self.hop_length
+        
+        # Onset strength: half-wave rectified log-spectral flux
+        log_mag = np.log1p(100.0 * magnitudes)
+        onset = np.maximum(np.diff(log_mag, axis=0), 0).sum(axis=1)
+        onset = onset - onset.mean()
+        
+        max_lag = int(np.ceil(60 * frame_rate / self.bpm_range[0]))
+        min_lag = int(np.floor(60 * frame_rate / self.bpm_range[1]))
+        if len(onset) <= max_lag + 1 or not onset.any():
+            return 120, 0.0
+        
+        # Autocorrelation via FFT (Wiener-Khinchin), zero-padded to avoid wrap-around
+        n = 1 << int(np.ceil(np.log2(2 * len(onset))))
+        spectrum = np.fft.rfft(onset, n)
+        autocorr = np.fft.irfft(spectrum * np.conj(spectrum), n)[:max_lag + 2]
+        autocorr = autocorr / autocorr[0]
+        
+        # Weight lags with a log-normal prior around 120 BPM to curb octave errors
+        lags = np.arange(min_lag, max_lag + 1)
+        bpms = 60 * frame_rate / lags
+        prior = np.exp(-0.5 * np.log2(bpms / 120.0) ** 2)
+        best = int(np.argmax(autocorr[lags] * prior))
+        lag = float(lags[best])
+        
+        # Parabolic interpolation for sub-frame lag resolution
+        prev, peak, nxt = autocorr[lags[best] - 1:lags[best] + 2]
+        denominator = prev - 2 * peak + nxt
+        if denominator < 0:
+            lag += 0.5 * (prev - nxt) / denominator
+        
+        bpm = int(round(60 * frame_rate / lag))
+        confidence = round(float(np.clip(peak, 0, 1)) * 100, 1)
+        return bpm, confidence
+    
+    def _spectral_centroid(self, magnitudes: np.ndarray, freqs: np.ndarray) -> float:
+        """Mean spectral centroid in Hz across frames"""
+        
+        frame_energy = magnitudes.sum(axis=1)
+        voiced = frame_energy > 0
+        if not voiced.any():
+            return 0.0
+        centroids = (magnitudes[voiced] @ freqs.astype(np.float32)) / frame_energy[voiced]
+        return round(float(centroids.mean()), 1)
+    
+    @staticmethod
+    def _zscore(values: np.ndarray) -> np.ndarray:
+        """Standardize along the last axis"""
+        
+        centered = values - values.mean(axis=-1, keepdims=True)
+        std = centered.std(axis=-1, keepdims=True)
+        return centered / np.where(std > 0, std, 1)